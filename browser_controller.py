@@ -3,49 +3,191 @@ import asyncio
 from playwright.async_api import async_playwright, Browser, Page, Playwright, Locator
 import logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
 logger = logging.getLogger(__name__)
 
 
-ELEMENT_TIMEOUT = 10000 
+ELEMENT_TIMEOUT = 10000
+
+JS_SCAN = """({selector, max}) => {
+    const out = [];
+    for (const el of document.querySelectorAll(selector)) {
+        if (out.length >= max) break;
+        const rect = el.getBoundingClientRect();
+        if (rect.width === 0 || rect.height === 0) continue;
+        if (getComputedStyle(el).visibility === 'hidden') continue;
+        const raw = {
+            tag: el.tagName.toLowerCase(),
+            text: (el.textContent || '').trim().slice(0, 200),
+            id: el.id || '',
+            name: el.name || '',
+            placeholder: el.placeholder || '',
+            'aria-label': el.getAttribute('aria-label') || '',
+            type: el.type || '',
+            role: el.getAttribute('role') || '',
+            value: typeof el.value === 'string' ? el.value : '',
+        };
+        const details = {tag: raw.tag};
+        for (const [k, v] of Object.entries(raw)) {
+            if (v) details[k] = v;
+        }
+        out.push(details);
+    }
+    return out;
+}"""
+
+JS_FINGERPRINT = """selector => {
+    let h = 0;
+    const mix = s => { for (let i = 0; i < s.length; i++) h = (h * 31 + s.charCodeAt(i)) | 0; };
+    const els = document.querySelectorAll(selector);
+    mix(String(els.length));
+    let labels = 0;
+    for (const el of els) {
+        mix(el.tagName);
+        const aria = el.getAttribute('aria-label');
+        if (aria && labels < 20) { mix(aria); labels++; }
+    }
+    mix(String(Math.floor(window.scrollY / 100)));
+    return h;
+}"""
+
+# Installed once per context so V8 compiles the scanner a single time; each
+# snapshot then ships only the tiny call expression below.
+JS_SCAN_INIT = ("window.__scanInteractive = " + JS_SCAN
+                + ";\nwindow.__scanFingerprint = " + JS_FINGERPRINT)
+JS_SCAN_CALL = "arg => window.__scanInteractive ? window.__scanInteractive(arg) : null"
+JS_FINGERPRINT_CALL = "sel => window.__scanFingerprint ? window.__scanFingerprint(sel) : null"
 
 class AsyncBrowserController:
+    INTERACTIVE_SELECTOR = ",".join([
+        "button",
+        "a[href]",
+        "input:not([type='hidden'])",
+        "textarea",
+        "select",
+        "[role='button']",
+        "[role='link']",
+        "[role='menuitem']",
+        "[role='tab']",
+        "[role='checkbox']",
+        "[role='radio']",
+        "[contenteditable='true']",
+    ])
+
+    BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+
+    __slots__ = ("playwright", "browser", "context", "page",
+                 "_locator_cache", "_state_cache", "_state_dirty", "_last_fp")
+
+    _shared_playwright: Playwright | None = None
+    _shared_browser: Browser | None = None
+    _launch_lock = asyncio.Lock()
+
     def __init__(self):
         self.playwright: Playwright | None = None
         self.browser: Browser | None = None
+        self.context = None
         self.page: Page | None = None
+        self._locator_cache: dict[tuple[int, str], Locator] = {}
+        self._state_cache: dict | None = None
+        self._state_dirty = True
+        self._last_fp: int | None = None
 
-    async def setup(self, headless=False):
+    async def setup(self, headless=False, block_resources=True):
         logger.info("Setting up browser...")
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=headless)
-        context = await self.browser.new_context()
-        self.page = await context.new_page()
+        cls = type(self)
+        async with cls._launch_lock:
+            if cls._shared_browser and cls._shared_browser.is_connected():
+                logger.info("Reusing already-running browser.")
+                self.playwright = cls._shared_playwright
+                self.browser = cls._shared_browser
+            else:
+                self.playwright = await async_playwright().start()
+                self.browser = await self.playwright.chromium.launch(headless=headless)
+                cls._shared_playwright = self.playwright
+                cls._shared_browser = self.browser
+        self.context = await self.browser.new_context()
+        await self.context.add_init_script(JS_SCAN_INIT)
+        if block_resources:
+            await self.context.route("**/*", self._route_handler)
+        self.page = await self.context.new_page()
+        self.page.on("framenavigated", lambda _: self._invalidate_caches())
         logger.info("Browser setup complete.")
         return self.page
 
-    async def teardown(self):
+    def _invalidate_caches(self):
+        """Marks cached page state stale after navigation or any page-mutating action.
+
+        The cached snapshot itself is kept so get_current_state can cheaply
+        re-validate it against the page fingerprint instead of always
+        re-extracting.
+        """
+        self._locator_cache.clear()
+        self._state_dirty = True
+
+    async def _route_handler(self, route):
+        """Aborts requests for heavyweight resources the agent never inspects."""
+        if route.request.resource_type in self.BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    @classmethod
+    async def shutdown_shared(cls):
+        """Closes the shared browser and Playwright driver kept alive across setups."""
+        async with cls._launch_lock:
+            if cls._shared_browser:
+                await cls._shared_browser.close()
+            if cls._shared_playwright:
+                await cls._shared_playwright.stop()
+            cls._shared_browser = None
+            cls._shared_playwright = None
+
+    def _get_locator(self, selector: str) -> Locator:
+        """Returns a cached Locator for the selector, avoiding re-parsing on repeat use."""
+        key = (id(self.page), selector)
+        locator = self._locator_cache.get(key)
+        if locator is None:
+            locator = self.page.locator(selector)
+            self._locator_cache[key] = locator
+        return locator
+
+    async def teardown(self, keep_browser=False):
         logger.info("Tearing down browser...")
         if self.page and not self.page.is_closed():
             await self.page.close()
-        if self.browser:
-            await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
+        if self.context:
+            await self.context.close()
+        if not keep_browser:
+            cls = type(self)
+            if self.browser:
+                await self.browser.close()
+            if self.playwright:
+                await self.playwright.stop()
+            cls._shared_browser = None
+            cls._shared_playwright = None
         self.page = None
+        self.context = None
         self.browser = None
         self.playwright = None
+        self._locator_cache.clear()
         logger.info("Browser teardown complete.")
 
     async def navigate(self, url: str):
         if not self.page or self.page.is_closed():
             logger.error("Navigate failed: Page not initialized or closed.")
             raise Exception("Page not initialized or closed")
+        self._state_dirty = True
         logger.info(f"Navigating to: {url}")
         try:
             await self.page.goto(url, wait_until="domcontentloaded", timeout=30000)
-            logger.info(f"Navigation successful. Current URL: {self.page.url}")
-            return {"success": True, "url": self.page.url}
+            url = self.page.url
+            logger.info(f"Navigation successful. Current URL: {url}")
+            return {"success": True, "url": url}
         except Exception as e:
             logger.error(f"Error navigating to {url}: {e}")
             return {"success": False, "error": str(e)}
@@ -55,16 +197,16 @@ class AsyncBrowserController:
         if not self.page or self.page.is_closed():
             logger.error("Scroll failed: Page not initialized or closed.")
             raise Exception("Page not initialized or closed")
+        self._state_dirty = True
         logger.info(f"Scrolling {direction}")
         try:
             if direction == "down":
-                await self.page.evaluate("window.scrollBy(0, window.innerHeight)")
+                await self.page.keyboard.press("PageDown")
             elif direction == "up":
-                 await self.page.evaluate("window.scrollBy(0, -window.innerHeight)")
+                await self.page.keyboard.press("PageUp")
             else:
                 logger.warning(f"Invalid scroll direction: {direction}")
                 return {"success": False, "error": f"Invalid direction: {direction}"}
-            await asyncio.sleep(0.5)
             logger.info("Scroll successful.")
             return {"success": True}
         except Exception as e:
@@ -72,115 +214,121 @@ class AsyncBrowserController:
             return {"success": False, "error": str(e)}
 
     async def _extract_element_details(self, locator: Locator) -> dict | None:
-        """Extracts key details from a Playwright Locator."""
+        """Extracts key details from a Playwright Locator in a single evaluate call."""
         try:
-            await locator.first.wait_for(state="visible", timeout=500)
-
-            element = locator.first
-            tag = await element.evaluate('el => el.tagName.toLowerCase()')
-            attrs = {
-                'text': await element.text_content(timeout=500) or "",
-                'id': await element.get_attribute('id', timeout=500) or "",
-                'name': await element.get_attribute('name', timeout=500) or "",
-                'placeholder': await element.get_attribute('placeholder', timeout=500) or "",
-                'aria-label': await element.get_attribute('aria-label', timeout=500) or "",
-                'type': await element.get_attribute('type', timeout=500) or "",
-                'role': await element.get_attribute('role', timeout=500) or "",
-                'value': await element.evaluate('el => el.value', timeout=500) or "",
-            }
-            details = {k: v for k, v in attrs.items() if v}
-            details['tag'] = tag
+            raw = await locator.first.evaluate(
+                """el => {
+                    if (!el.offsetParent && el.tagName.toLowerCase() !== 'body') return null;
+                    return {
+                        tag: el.tagName.toLowerCase(),
+                        text: (el.textContent || '').trim().slice(0, 200),
+                        id: el.id || '',
+                        name: el.name || '',
+                        placeholder: el.placeholder || '',
+                        'aria-label': el.getAttribute('aria-label') || '',
+                        type: el.type || '',
+                        role: el.getAttribute('role') || '',
+                        value: typeof el.value === 'string' ? el.value : '',
+                    };
+                }"""
+            )
+            if not raw:
+                return None
+            details = {k: v for k, v in raw.items() if v}
+            details['tag'] = raw['tag']
             return details
         except Exception as e:
             return None
 
     async def get_interactive_elements(self) -> list[dict]:
         """Gets details of visible interactive elements on the page."""
-        if not self.page or self.page.is_closed(): return []
+        page = self.page
+        if not page or page.is_closed(): return []
         logger.info("Extracting interactive elements...")
-        elements = []
-        selectors = [
-            "button",
-            "a[href]",
-            "input:not([type='hidden'])",
-            "textarea",
-            "select",
-            "[role='button']",
-            "[role='link']",
-            "[role='menuitem']",
-            "[role='tab']",
-            "[role='checkbox']",
-            "[role='radio']",
-            "[contenteditable='true']",
-        ]
-
         max_elements = 30
-        count = 0
-
-        element_tasks = []
-
-        all_locators = []
-        for selector in selectors:
-            try:
-                locator = self.page.locator(selector)
-                all_locators.append(locator)
-            except Exception as e:
-                 logger.warning(f"Could not create locator for selector '{selector}': {e}")
-
-
-        locator_results = await asyncio.gather(
-            *[loc.all() for loc in all_locators],
-            return_exceptions=True
-        )
-
-        for i, result in enumerate(locator_results):
-            if isinstance(result, Exception):
-                logger.warning(f"Error fetching elements for selector group {i}: {result}")
-                continue
-            if count >= max_elements: break
-            for element_handle in result:
-                 if count >= max_elements: break
-                 try:
-                     pass 
-                 except Exception as e:
-                     pass
-
-
-        for selector in selectors:
-             if count >= max_elements: break
-             try:
-                 locator = self.page.locator(selector)
-                 num_matches = await locator.count()
-                 for i in range(num_matches):
-                     if count >= max_elements: break
-                     try:
-                         element_locator = locator.nth(i)
-                         if await element_locator.is_visible(timeout=500):
-                             details = await self._extract_element_details(element_locator)
-                             if details:
-                                 elements.append(details)
-                                 count += 1
-                     except Exception as inner_e:
-                         continue
-             except Exception as e:
-                 logger.warning(f"Error locating elements with selector '{selector}': {e}")
-                 continue
 
+        scan_arg = {"selector": self.INTERACTIVE_SELECTOR, "max": max_elements}
+        try:
+            elements = await page.evaluate(JS_SCAN_CALL, scan_arg)
+            if elements is None:
+                # Page predates the init script (e.g. attached externally); ship the full scanner.
+                elements = await page.evaluate(JS_SCAN, scan_arg)
+        except Exception as e:
+            logger.warning(f"Error scanning interactive elements: {e}")
+            return []
 
         logger.info(f"Extracted {len(elements)} interactive elements.")
         return elements
 
 
+    async def _fingerprint(self) -> int | None:
+        """Cheap one-trip hash of the page's interactive structure, used to
+        decide whether a cached state snapshot is still valid."""
+        try:
+            return await self.page.evaluate(JS_FINGERPRINT_CALL, self.INTERACTIVE_SELECTOR)
+        except Exception:
+            return None
+
+    async def get_interactive_elements_fast(self) -> list[dict]:
+        """Enumerates interactive elements by parsing page HTML in-process.
+
+        Fetches the document once with page.content() and runs the selector
+        query through selectolax (C parser, no further CDP traffic). Falls
+        back to the live in-browser scan when selectolax is unavailable.
+        Static parsing cannot check visibility, so prefer the regular path
+        when hidden elements would mislead the LLM.
+        """
+        if HTMLParser is None:
+            return await self.get_interactive_elements()
+        if not self.page or self.page.is_closed(): return []
+        try:
+            html = await self.page.content()
+        except Exception as e:
+            logger.warning(f"Error fetching page content: {e}")
+            return []
+        elements = []
+        for node in HTMLParser(html).css(self.INTERACTIVE_SELECTOR)[:30]:
+            attrs = node.attributes or {}
+            raw = {
+                'text': (node.text(strip=True) or "")[:200],
+                'id': attrs.get('id') or "",
+                'name': attrs.get('name') or "",
+                'placeholder': attrs.get('placeholder') or "",
+                'aria-label': attrs.get('aria-label') or "",
+                'type': attrs.get('type') or "",
+                'role': attrs.get('role') or "",
+                'value': attrs.get('value') or "",
+            }
+            details = {k: v for k, v in raw.items() if v}
+            details['tag'] = node.tag
+            elements.append(details)
+        logger.info(f"Extracted {len(elements)} interactive elements (static parse).")
+        return elements
+
     async def get_current_state(self) -> dict:
         """Gets URL, Title, and basic interactive element info."""
-        if not self.page or self.page.is_closed():
+        page = self.page
+        if not page or page.is_closed():
              logger.warning("Attempted to get state from closed or uninitialized page.")
              return {"url": "N/A - Page Closed", "title": "N/A", "elements": []}
+        if not self._state_dirty and self._state_cache is not None:
+            logger.info("Returning cached page state.")
+            return self._state_cache
         try:
-            url = self.page.url
-            title = await self.page.title()
+            url = page.url
+            if self._state_cache is not None and self._state_cache["url"] == url:
+                fp = await self._fingerprint()
+                if fp is not None and fp == self._last_fp:
+                    logger.info("Page fingerprint unchanged; reusing cached state.")
+                    self._state_dirty = False
+                    return self._state_cache
+            title = await page.title()
             elements = await self.get_interactive_elements()
-            return {"url": url, "title": title, "elements": elements}
+            state = {"url": url, "title": title, "elements": elements}
+            self._state_cache = state
+            self._state_dirty = False
+            self._last_fp = await self._fingerprint()
+            return state
         except Exception as e:
             logger.error(f"Error getting current page state: {e}")
             url = "Error"
@@ -193,33 +341,70 @@ class AsyncBrowserController:
                 pass
             return {"url": url, "title": title, "elements": []}
 
+    async def _wait_after_click(self, old_url: str | None = None):
+        """Waits for the page to settle after a click without a fixed sleep.
+
+        Non-navigating clicks (modals, toggles, dropdowns) leave the URL
+        unchanged and only pay a short bounded wait; actual navigations get
+        the full load-state wait.
+        """
+        try:
+            await self.page.wait_for_load_state("domcontentloaded", timeout=1500)
+        except Exception:
+            pass
+        if old_url is not None and self.page.url == old_url:
+            return
+        try:
+            await self.page.wait_for_load_state("domcontentloaded", timeout=10000)
+            await self.page.wait_for_load_state("networkidle", timeout=1500)
+        except Exception:
+            pass
+
     async def click(self, selector: str):
         if not self.page or self.page.is_closed():
             logger.error("Click failed: Page not initialized or closed.")
             raise Exception("Page not initialized or closed")
+        self._state_dirty = True
         logger.info(f"Attempting to click selector: {selector}")
+        old_url = self.page.url
         try:
-            locator = self.page.locator(selector).first
-            await locator.wait_for(state="visible", timeout=ELEMENT_TIMEOUT)
-            await locator.hover(timeout=2000)
-            await asyncio.sleep(0.1)
-            await locator.scroll_into_view_if_needed(timeout=5000)
-            await locator.click(timeout=5000)
-            await self.page.wait_for_load_state("domcontentloaded", timeout=10000)
-            await asyncio.sleep(1)
-            logger.info(f"Click successful. Current URL: {self.page.url}")
-            return {"success": True, "url": self.page.url}
+            locator = self._get_locator(selector).first
+            try:
+                # Plain links hide a simple HTTP fetch behind the click; goto
+                # skips the hover/click/event-routing cycle entirely.
+                info = await locator.evaluate(
+                    "el => ({tag: el.tagName.toLowerCase(), href: el.href || '', onclick: !!el.onclick})",
+                    timeout=2000,
+                )
+                if info["tag"] == "a" and info["href"].startswith("http") and not info["onclick"]:
+                    logger.info(f"Plain link detected; navigating directly to {info['href']}")
+                    return await self.navigate(info["href"])
+            except Exception:
+                pass
+            try:
+                await locator.click(timeout=2000)
+            except Exception as fast_e:
+                logger.info(f"Fast click failed ({fast_e}). Retrying with full choreography...")
+                await locator.wait_for(state="visible", timeout=ELEMENT_TIMEOUT)
+                await locator.hover(timeout=2000)
+                await asyncio.sleep(0.1)
+                await locator.scroll_into_view_if_needed(timeout=5000)
+                await locator.click(timeout=5000)
+            await self._wait_after_click(old_url)
+            url = self.page.url
+            logger.info(f"Click successful. Current URL: {url}")
+            return {"success": True, "url": url}
         except Exception as e:
             logger.error(f"Error clicking {selector}: {e}")
             try:
                 logger.warning("Standard click failed. Attempting JS click fallback...")
-                locator = self.page.locator(selector).first
+                locator = self._get_locator(selector).first
                 await locator.wait_for(state="attached", timeout=ELEMENT_TIMEOUT)
                 await locator.evaluate("el => el.click()")
-                await self.page.wait_for_load_state("domcontentloaded", timeout=10000)
-                await asyncio.sleep(1)
-                logger.info(f"JS click fallback successful. Current URL: {self.page.url}")
-                return {"success": True, "url": self.page.url}
+                await self._wait_after_click(old_url)
+                url = self.page.url
+                logger.info(f"JS click fallback successful. Current URL: {url}")
+                return {"success": True, "url": url}
             except Exception as js_e:
                 logger.error(f"JS click fallback failed for {selector}: {js_e}")
                 return {"success": False, "error": f"Initial error: {e}. Fallback error: {js_e}"}
@@ -229,9 +414,10 @@ class AsyncBrowserController:
         if not self.page or self.page.is_closed():
              logger.error("Type failed: Page not initialized or closed.")
              raise Exception("Page not initialized or closed")
+        self._state_dirty = True
         logger.info(f"Attempting to type '{text}' into selector: {selector}")
         try:
-            locator = self.page.locator(selector).first # Target the first match
+            locator = self._get_locator(selector).first # Target the first match
             await locator.wait_for(state="visible", timeout=ELEMENT_TIMEOUT)
             await locator.scroll_into_view_if_needed(timeout=5000)
             await locator.fill(text)
@@ -8,15 +8,23 @@ from llm_translator import translate_command_to_action
 
 logger = logging.getLogger(__name__)
 
+TRANSLATION_TIMEOUT = 180.0
+
 class InteractionAgent:
     """
     An agent that interacts with a web browser based on natural language commands.
     It uses an LLM to translate commands into actions and a browser controller
     to execute them.
     """
+    __slots__ = ("controller", "_is_setup", "_prefetch_task", "_action_dispatch")
+
     def __init__(self):
-        self.controller = AsyncBrowserController()
+        # The controller (and with it the dispatch table) is created lazily in
+        # setup() so constructing an agent allocates nothing heavyweight.
+        self.controller: AsyncBrowserController | None = None
         self._is_setup = False
+        self._prefetch_task: asyncio.Task | None = None
+        self._action_dispatch: dict = {}
 
     async def setup(self, headless=False):
         """Initializes the browser controller."""
@@ -24,6 +32,13 @@ class InteractionAgent:
             logger.warning("Agent already set up.")
             return
         logger.info("Setting up Interaction Agent...")
+        self.controller = AsyncBrowserController()
+        self._action_dispatch = {
+            "navigate": self.controller.navigate,
+            "click": self.controller.click,
+            "type": self.controller.type,
+            "scroll": self.controller.scroll,
+        }
         await self.controller.setup(headless=headless)
         self._is_setup = True
         logger.info("Interaction Agent setup complete.")
@@ -34,6 +49,9 @@ class InteractionAgent:
             logger.warning("Agent not set up, cannot close.")
             return
         logger.info("Closing Interaction Agent...")
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+            self._prefetch_task = None
         await self.controller.teardown()
         self._is_setup = False
         logger.info("Interaction Agent closed.")
@@ -58,7 +76,7 @@ class InteractionAgent:
         logger.info(f"Received command: '{command}'")
 
         try:
-            current_state = await self.controller.get_current_state()
+            current_state = await self._get_state()
             if current_state.get("url") == "N/A - Page Closed":
                  logger.error("Browser page seems to be closed unexpectedly.")
                  return {"success": False, "error": "Browser page is closed"}
@@ -66,7 +84,18 @@ class InteractionAgent:
             logger.error(f"Failed to get current browser state: {e}")
             return {"success": False, "error": f"Failed to get browser state: {e}"}
 
-        action_plan = await translate_command_to_action(command, current_state)
+        try:
+            if hasattr(asyncio, "timeout"):  # Python 3.11+: cheaper than wait_for's task wrapper
+                async with asyncio.timeout(TRANSLATION_TIMEOUT):
+                    action_plan = await translate_command_to_action(command, current_state)
+            else:
+                action_plan = await asyncio.wait_for(
+                    translate_command_to_action(command, current_state),
+                    timeout=TRANSLATION_TIMEOUT,
+                )
+        except (TimeoutError, asyncio.TimeoutError):
+            logger.error("LLM translation timed out.")
+            return {"success": False, "error": "LLM translation timed out"}
 
         if not action_plan:
             logger.error("Failed to translate command to action plan.")
@@ -78,21 +107,33 @@ class InteractionAgent:
 
         result = None
         try:
-            if action_name == "navigate":
-                result = await self.controller.navigate(**params)
-            elif action_name == "click":
-                result = await self.controller.click(**params)
-            elif action_name == "type":
-                result = await self.controller.type(**params)
-            elif action_name == "scroll":
-                result = await self.controller.scroll(**params)
-            else:
+            action_fn = self._action_dispatch.get(action_name)
+            if action_fn is None:
                 logger.error(f"Unknown action received from translator: {action_name}")
                 result = {"success": False, "error": f"Unknown action: {action_name}"}
+            else:
+                result = await action_fn(**params)
 
         except Exception as e:
             logger.error(f"Error executing action '{action_name}' with params {params}: {e}")
             result = {"success": False, "error": f"Execution failed for action {action_name}: {e}"}
 
         logger.info(f"Action result: {result}")
-        return result
\ No newline at end of file
+
+        # Start extracting the post-action state now so the next interact()
+        # call finds it ready instead of paying the extraction latency itself.
+        if self._is_setup:
+            self._prefetch_task = asyncio.create_task(self.controller.get_current_state())
+
+        return result
+
+    async def _get_state(self) -> dict:
+        """Returns the current browser state, consuming a prefetched snapshot if one is pending."""
+        task = self._prefetch_task
+        self._prefetch_task = None
+        if task is not None:
+            try:
+                return await task
+            except Exception as e:
+                logger.warning(f"State prefetch failed, re-fetching: {e}")
+        return await self.controller.get_current_state()
\ No newline at end of file
@@ -1,9 +1,30 @@
 import os
+import re
 import json
-from openai import AsyncOpenAI
+import asyncio
+import hashlib
+from collections import OrderedDict
+import random
+import httpx
+from openai import AsyncOpenAI, RateLimitError
 from dotenv import load_dotenv
 import logging
 
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    def _dumps_sorted(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+except ImportError:
+    def _dumps(obj) -> str:
+        return json.dumps(obj)
+
+    def _dumps_sorted(obj) -> bytes:
+        return json.dumps(obj, sort_keys=True).encode()
+
 logger = logging.getLogger(__name__)
 load_dotenv()
 
@@ -12,68 +33,232 @@ if not groq_api_key:
     logger.warning("GROQ_API_KEY not found in environment variables.")
     aclient = None
 else:
+    # A generously-pooled transport keeps connections warm across the many
+    # short completion calls an agent session makes.
     aclient = AsyncOpenAI(
         base_url="https://api.groq.com/openai/v1",
-        api_key=groq_api_key
+        api_key=groq_api_key,
+        http_client=httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+        ),
     )
 
 SYSTEM_PROMPT = """
-You are an AI agent controlling a web browser based on user commands.
-Your goal is to translate the user's command into a single, executable browser action.
-You are given the user's command and the current state of the browser, which includes:
-- `url`: The current URL.
-- `title`: The current page title.
-- `elements`: A list of visible interactive elements on the page. Each element is a dictionary containing its `tag`, and potentially attributes like `text`, `id`, `name`, `placeholder`, `aria-label`, `type`, `role`, `value`.
-
-Available actions:
-1.  `navigate`: Go to a specific URL. Requires `url` parameter (e.g., {"action": "navigate", "parameters": {"url": "https://example.com"}}).
-2.  `click`: Click on an element. Requires a `selector` parameter (CSS selector) (e.g., {"action": "click", "parameters": {"selector": "button#login-button"}}).
-3.  `type`: Type text into an input field. Requires `selector` (CSS selector) and `text` parameters (e.g., {"action": "type", "parameters": {"selector": "input[name='username']", "text": "myuser"}}).
-4.  `scroll`: Scroll the page up or down. Requires `direction` parameter ("up" or "down") (e.g., {"action": "scroll", "parameters": {"direction": "down"}}).
-
-Based on the user command and the *provided elements list*, determine the most appropriate *single* action to perform next.
-
-**IMPORTANT for `click` and `type` actions:**
-- Analyze the `elements` list carefully to find the element that best matches the user's intent (text content, labels, placeholders, etc.).
-- Construct the most robust and specific CSS selector possible for the *target element* identified in the list.
-- **Prioritize using unique attributes**: id, name, aria-label, test-id (if available). Use them directly: `#element-id`, `[name="user_name"]`, `[aria-label="Search website"]`.
-- If unique attributes are missing, combine tag with other attributes or text: `button:has-text('Log In')`, `input[placeholder='Enter your email']`, `a[role='menuitem']:has-text('Profile')`.
-- Be precise with text matching: Use `has-text("Exact Text")`. Escape quotes within the text if necessary (e.g., `has-text(\\"User's Guide\\")`).
-- If multiple similar elements exist, try to find distinguishing attributes or use positional selectors like `:first`, `:nth-child(n)`, but only if the user's command implies position (e.g., "click the first button").
-
-**SPECIAL INSTRUCTIONS FOR GOOGLE SEARCH RESULTS:**
-- Search results are usually links (`<a>` tag) often containing a heading (`<h3>` tag with the result title).
-- To target the **first search result link**, a reliable selector is often `div#search a:has(h3):first-of-type`. Use this pattern if the user asks for the first result.
-- If the user asks for a result by its title (e.g., "Click the link titled 'Playwright Docs'"), find the `<a>` tag containing an `<h3>` with that text. A good selector might be `a:has(h3:has-text("Playwright Docs"))`. Adapt the text precisely.
-
-- Ensure the generated selector uniquely targets the intended element based on the provided list and common web structures. Do not invent selectors for elements not present in the list unless it's a standard browser feature (like scroll).
-
-Respond ONLY with a single JSON object containing the fields "action" (string) and "parameters" (object).
-Example Command: "Go to playwright.dev"
-Example State: {"url": "https://google.com", "title": "Google", "elements": []}
-Example Response: {"action": "navigate", "parameters": {"url": "https://playwright.dev"}}
-
-Example Command: "Type 'test query' into the search bar"
-Example State: {"url": "https://google.com", "title": "Google", "elements": [{"tag":"textarea", "name": "q", "aria-label": "Search"}]}
-Example Response: {"action": "type", "parameters": {"selector": "textarea[name='q']", "text": "test query"}}
-
-Example Command: "Click the login button"
-Example State: {"url": "...", "title": "...", "elements": [{"tag": "button", "id": "login-btn", "text": "Log In"}]}
-Example Response: {"action": "click", "parameters": {"selector": "#login-btn"}}
-
-Example Command: "Click the first search result link"
-Example State: {"url": "https://google.com/search?q=...", "title": "Search Results", "elements": [...]}
-Example Response: {"action": "click", "parameters": {"selector": "div#search a:has(h3):first-of-type"}}
-
-Example Command: "Click the result titled 'Official Python Website'"
-Example State: {"url": "https://google.com/search?q=...", "title": "Search Results", "elements": [{"tag": "a", "href":"...", "text": "..."}, {"tag": "h3", "text": "Official Python Website"}, ...]}
-Example Response: {"action": "click", "parameters": {"selector": "a:has(h3:has-text(\\"Official Python Website\\"))"}}
-
-Example Command: "Scroll down"
-Example State: {"url": "...", "title": "...", "elements": [...]}
-Example Response: {"action": "scroll", "parameters": {"direction": "down"}}
+You control a web browser. Translate the user's command plus the current browser state into exactly ONE action, and respond ONLY with a single JSON object: {"action": <string>, "parameters": <object>}.
+
+State fields:
+- `url`, `title`: the current page.
+- `elements`: visible interactive elements as a table — `header` names the columns (`tag`, `text`, `id`, `name`, `placeholder`, `aria-label`, `type`, `role`, `value`) and `rows` holds one element per row in that order. An empty cell means the attribute is absent.
+
+Actions:
+- navigate: parameters {"url": "<absolute URL>"}
+- click: parameters {"selector": "<CSS selector>"}
+- type: parameters {"selector": "<CSS selector>", "text": "<text>"}
+- scroll: parameters {"direction": "up" | "down"}
+
+Selector rules for click/type:
+- Choose the element from `elements` that best matches the command; never invent selectors for elements not in the list (except standard browser features like scroll).
+- Prefer unique attributes, in order: `#id`, `[name="..."]`, `[aria-label="..."]`. Otherwise combine tag with text or attributes: `button:has-text('Log In')`, `input[placeholder='Email']`.
+- Match text exactly with `has-text("...")`, escaping embedded quotes. Use positional selectors (`:first`, `:nth-child(n)`) only when the command implies position.
+- Google search results: the first result link is `div#search a:has(h3):first-of-type`; a result titled T is `a:has(h3:has-text("T"))`.
+
+Examples:
+Command: "Type 'test query' into the search bar"
+State: {"url": "https://google.com", "title": "Google", "elements": {"header": ["tag", "text", "id", "name", "placeholder", "aria-label", "type", "role", "value"], "rows": [["textarea", "", "", "q", "", "Search", "", "", ""]]}}
+Response: {"action": "type", "parameters": {"selector": "textarea[name='q']", "text": "test query"}}
+
+Command: "Click the login button"
+State: {"url": "...", "title": "...", "elements": {"header": ["tag", "text", "id", "name", "placeholder", "aria-label", "type", "role", "value"], "rows": [["button", "Log In", "login-btn", "", "", "", "", "", ""]]}}
+Response: {"action": "click", "parameters": {"selector": "#login-btn"}}
+
+Command: "Scroll down"
+Response: {"action": "scroll", "parameters": {"direction": "down"}}
 """
 
+def _is_str(value) -> bool:
+    return isinstance(value, str)
+
+
+# Per-action parameter validators, looked up once per response instead of
+# walking an if/elif chain of per-action checks.
+VALIDATORS: dict[str, dict] = {
+    "navigate": {"url": _is_str},
+    "click": {"selector": _is_str},
+    "type": {"selector": _is_str, "text": _is_str},
+    "scroll": {"direction": lambda v: v in ("up", "down")},
+}
+
+ACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["navigate", "click", "type", "scroll"]},
+        "parameters": {"type": "object", "additionalProperties": True},
+    },
+    "required": ["action", "parameters"],
+    "additionalProperties": False,
+}
+
+_json_schema_supported = True
+
+# LRU of recent translations keyed by (command, state digest); identical
+# command+state pairs skip the LLM round-trip entirely.
+_translation_cache: OrderedDict[tuple, dict] = OrderedDict()
+_TRANSLATION_CACHE_MAX = 64
+
+
+# The system message never changes; build it once instead of per call.
+_SYSTEM_MSG = {"role": "system", "content": SYSTEM_PROMPT}
+
+try:
+    import tiktoken
+    _ENC = tiktoken.get_encoding("cl100k_base")
+
+    def _token_len(text: str) -> int:
+        return len(_ENC.encode(text))
+except ImportError:
+    def _token_len(text: str) -> int:
+        return len(text) // 4 + 1  # ~4 chars/token heuristic
+
+MAX_STATE_TOKENS = 1500
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _select_elements(elements: list[dict], command: str) -> list[dict]:
+    """Ranks elements by relevance to the command and packs them under a
+    token budget, instead of blindly keeping the first N and silently
+    dropping whatever the user was actually referring to."""
+    command_words = {w for w in _WORD_RE.findall(command.lower()) if len(w) > 2}
+
+    def score(el: dict) -> int:
+        haystack = " ".join(str(v) for v in el.values()).lower()
+        s = sum(1 for w in command_words if w in haystack)
+        if el.get("id") or el.get("aria-label"):
+            s += 1
+        return s
+
+    ranked = sorted(range(len(elements)), key=lambda i: (-score(elements[i]), i))
+    kept = []
+    used = 0
+    for i in ranked:
+        cost = _token_len(_dumps(elements[i]))
+        if used + cost > MAX_STATE_TOKENS:
+            continue
+        kept.append(i)
+        used += cost
+    if len(kept) < len(elements):
+        logger.warning(f"Token budget dropped {len(elements) - len(kept)} of {len(elements)} elements from the prompt.")
+    kept.sort()  # restore DOM order for the model
+    return [elements[i] for i in kept]
+
+
+ELEMENT_COLUMNS = ("tag", "text", "id", "name", "placeholder", "aria-label", "type", "role", "value")
+
+
+def _tabulate_elements(elements: list[dict]) -> dict:
+    """Renders element dicts as a shared-header table so repeated key names
+    are not serialized once per element in the prompt."""
+    return {
+        "header": list(ELEMENT_COLUMNS),
+        "rows": [[el.get(col, "") for col in ELEMENT_COLUMNS] for el in elements],
+    }
+
+
+def _normalize_url(raw: str) -> str:
+    return raw if raw.startswith(("http://", "https://")) else f"https://{raw}"
+
+
+# Trivially parseable commands skip the LLM round-trip entirely.
+_FAST_PATHS = [
+    (re.compile(r"^\s*scroll\s+(up|down)\s*$", re.I),
+     lambda m: {"action": "scroll", "parameters": {"direction": m.group(1).lower()}}),
+    (re.compile(r"^\s*(?:go to|navigate to|open)\s+(\S+\.\S+)\s*$", re.I),
+     lambda m: {"action": "navigate", "parameters": {"url": _normalize_url(m.group(1))}}),
+]
+
+
+def _cache_key(command: str, prompt_state: dict) -> tuple:
+    digest = hashlib.blake2b(_dumps_sorted(prompt_state), digest_size=16).digest()
+    return (command, digest)
+
+
+# Bound concurrent in-flight completions (translate_many bursts) and absorb
+# transient 429s with jittered exponential backoff.
+_SEM = asyncio.Semaphore(int(os.environ.get("GROQ_MAX_CONCURRENCY", "8")))
+_MAX_RETRIES = 5
+
+
+async def _request_with_backoff(messages: list[dict]) -> str:
+    delay = 0.5
+    for attempt in range(_MAX_RETRIES):
+        try:
+            async with _SEM:
+                return await _request_action_json(messages)
+        except RateLimitError:
+            if attempt == _MAX_RETRIES - 1:
+                raise
+            logger.warning(f"Rate limited by LLM endpoint; retrying in ~{delay:.1f}s.")
+            await asyncio.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, 8.0)
+
+
+async def _consume_stream(stream) -> str:
+    """Accumulates streamed content and closes the stream as soon as a
+    complete JSON object has been emitted."""
+    buffer = ""
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        buffer += delta
+        if buffer.rstrip().endswith("}"):
+            try:
+                json.loads(buffer)
+            except json.JSONDecodeError:
+                continue
+            await stream.close()
+            break
+    return buffer
+
+
+async def _request_action_json(messages: list[dict]) -> str:
+    """Requests a completion and returns the raw action JSON, preferring
+    strict json_schema output and falling back to plain json_object mode for
+    endpoints that reject it. Responses are streamed so the call returns as
+    soon as the (short) action object closes rather than after the full
+    generation."""
+    global _json_schema_supported
+    if _json_schema_supported:
+        try:
+            stream = await aclient.chat.completions.create(
+                model="llama3-70b-8192",
+                messages=messages,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {"name": "browser_action", "schema": ACTION_SCHEMA, "strict": True},
+                },
+                temperature=0.05,
+                max_tokens=120,
+                stream=True,
+            )
+            return await _consume_stream(stream)
+        except Exception as e:
+            logger.warning(f"json_schema response format rejected ({e}); falling back to json_object.")
+            _json_schema_supported = False
+    stream = await aclient.chat.completions.create(
+        model="llama3-70b-8192",
+        messages=messages,
+        response_format={"type": "json_object"},
+        temperature=0.05,
+        max_tokens=120,
+        stream=True,
+    )
+    return await _consume_stream(stream)
+
+
 async def translate_command_to_action(command: str, state: dict) -> dict | None:
     """
     Translates a natural language command and browser state into a structured action.
@@ -86,6 +271,13 @@ async def translate_command_to_action(command: str, state: dict) -> dict | None:
         A dictionary representing the action (e.g., {"action": "click", "parameters": {"selector": "..."}})
         or None if translation fails.
     """
+    for pattern, build in _FAST_PATHS:
+        match = pattern.match(command)
+        if match:
+            action_data = build(match)
+            logger.info(f"Fast-path translation (no LLM): {action_data}")
+            return action_data
+
     if not aclient:
         logger.error("LLM client is not initialized. Cannot translate command.")
         return None
@@ -94,26 +286,26 @@ async def translate_command_to_action(command: str, state: dict) -> dict | None:
 
     action_json = None
     try:
-        prompt_state = state.copy()
-        max_elements_in_prompt = 25
-        if len(prompt_state.get("elements", [])) > max_elements_in_prompt:
-             logger.warning(f"Truncating elements list from {len(prompt_state['elements'])} to {max_elements_in_prompt} for LLM prompt.")
-             prompt_state["elements"] = prompt_state["elements"][:max_elements_in_prompt]
+        elements = _select_elements(state.get("elements") or [], command)
+        prompt_state = {
+            "url": state.get("url"),
+            "title": state.get("title"),
+            "elements": _tabulate_elements(elements),
+        }
+
+        cache_key = _cache_key(command, prompt_state)
+        cached = _translation_cache.get(cache_key)
+        if cached is not None:
+            _translation_cache.move_to_end(cache_key)
+            logger.info(f"Translation cache hit for command: '{command}'")
+            return cached
 
         messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": f"Command: \"{command}\"\nCurrent State: {json.dumps(prompt_state)}"}
+            _SYSTEM_MSG,
+            {"role": "user", "content": f"Command: \"{command}\"\nCurrent State: {_dumps(prompt_state)}"}
         ]
 
-        response = await aclient.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=messages,
-            response_format={"type": "json_object"},
-            temperature=0.05,
-            max_tokens=500,
-        )
-
-        action_json = response.choices[0].message.content
+        action_json = await _request_with_backoff(messages)
         logger.info(f"LLM Response JSON: {action_json}")
         action_data = json.loads(action_json)
 
@@ -127,19 +319,20 @@ async def translate_command_to_action(command: str, state: dict) -> dict | None:
         action_name = action_data["action"]
         params = action_data["parameters"]
 
-        if action_name == "navigate" and ("url" not in params or not isinstance(params.get("url"), str)):
-             raise ValueError("LLM response for 'navigate' missing or invalid 'url' parameter.")
-        if action_name in ["click", "type"] and ("selector" not in params or not isinstance(params.get("selector"), str)):
-             raise ValueError(f"LLM response for action '{action_name}' missing or invalid 'selector' parameter.")
-        if action_name == "type" and ("text" not in params or not isinstance(params.get("text"), str)):
-             raise ValueError("LLM response for action 'type' missing 'text' parameter.")
-        if action_name == "scroll" and ("direction" not in params or params.get("direction") not in ["up", "down"]):
-             raise ValueError("LLM response for 'scroll' missing or invalid 'direction' parameter.")
-        if action_name not in ["navigate", "click", "type", "scroll"]:
+        spec = VALIDATORS.get(action_name)
+        if spec is None:
             raise ValueError(f"LLM proposed an unknown action: '{action_name}'")
+        for param_name, check in spec.items():
+            if not check(params.get(param_name)):
+                raise ValueError(
+                    f"LLM response for action '{action_name}' missing or invalid '{param_name}' parameter."
+                )
 
 
         logger.info(f"Translation successful: Action='{action_name}', Params={params}")
+        _translation_cache[cache_key] = action_data
+        if len(_translation_cache) > _TRANSLATION_CACHE_MAX:
+            _translation_cache.popitem(last=False)
         return action_data
 
     except json.JSONDecodeError as e:
@@ -147,4 +340,18 @@ async def translate_command_to_action(command: str, state: dict) -> dict | None:
         return None
     except Exception as e:
         logger.error(f"Error interacting with LLM or validating response: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+async def translate_many(commands_states: list[tuple[str, dict]]) -> list[dict | None]:
+    """
+    Translates several (command, state) pairs concurrently.
+
+    The shared client serves the requests in parallel; failures are isolated
+    per entry and surface as None, matching translate_command_to_action.
+    """
+    results = await asyncio.gather(
+        *(translate_command_to_action(command, state) for command, state in commands_states),
+        return_exceptions=True,
+    )
+    return [None if isinstance(r, BaseException) else r for r in results]
\ No newline at end of file
@@ -1,14 +1,54 @@
 
 import asyncio
 import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
 
 from interaction_agent import InteractionAgent
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+
+def _stdin_reader(loop: asyncio.AbstractEventLoop, commands: asyncio.Queue):
+    """Feeds stdin lines into the queue from a daemon thread so the event
+    loop (and the state prefetch task) keeps running while the user types."""
+    for line in iter(sys.stdin.readline, ''):
+        loop.call_soon_threadsafe(commands.put_nowait, line)
+    loop.call_soon_threadsafe(commands.put_nowait, None)  # EOF sentinel
+
+
+def _start_log_listener() -> QueueListener:
+    """Routes log records through a queue so the event loop never blocks on
+    slow stdout/stderr sinks (pipes, journald)."""
+    root = logging.getLogger()
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *root.handlers)
+    root.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
 async def main():
 
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%H:%M:%S',  # skips strftime's microsecond formatting path
+    )
+
+    loop = asyncio.get_running_loop()
+    eager_factory = getattr(asyncio, "eager_task_factory", None)
+    if eager_factory is not None:  # Python 3.12+: run tasks inline until first suspension
+        loop.set_task_factory(eager_factory)
+
+    log_listener = _start_log_listener()
     agent = InteractionAgent()
     try:
         await agent.setup(headless=False)
@@ -16,9 +56,17 @@ async def main():
         print("\nBrowser Navigation Agent Initialized.")
         print("Enter your commands below (e.g., 'Go to google.com', 'Type 'playwright' into the search bar', 'Click the first search result', 'scroll down', 'quit').")
 
+        commands: asyncio.Queue = asyncio.Queue()
+        threading.Thread(target=_stdin_reader, args=(loop, commands), daemon=True).start()
+
         while True:
             try:
-                command = input("> ")
+                print("> ", end="", flush=True)
+                line = await commands.get()
+                if line is None:
+                    logger.info("End of input reached. Exiting...")
+                    break
+                command = line.strip()
                 if not command:
                     continue
                 if command.lower() in ['quit', 'exit']:
@@ -50,6 +98,7 @@ async def main():
         logger.info("Shutting down agent...")
         await agent.close()
         logger.info("Agent shutdown complete.")
+        log_listener.stop()
         print("Browser closed. Exiting program.")
 
 